@@ -9,7 +9,7 @@ from scipy.special import sph_harm
 
 from . import data
 from .exceptions import DataNotFound, InvalidResult
-from .util import bo_logger, dict_decode
+from .util import bo_logger, dict_decode, encode_array
 
 
 class Shell(MSONable):
@@ -38,8 +38,8 @@ class Shell(MSONable):
             "@module": type(self).__module__,
             "@class": type(self).__name__,
             "l": self.l,
-            "exps": self.exps,
-            "coefs": self.coefs,
+            "exps": encode_array(self.exps),
+            "coefs": [encode_array(c) for c in self.coefs],
         }
         return d
 
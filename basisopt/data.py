@@ -13,11 +13,26 @@ TO_ANGSTROM = 0.5291761
 FORCE_MASS = 1822.88853
 
 
+_ELEMENT_SYMBOLS = """
+H He Li Be B C N O F Ne Na Mg Al Si P S Cl Ar K Ca Sc Ti V Cr Mn Fe Co Ni Cu Zn Ga Ge As Se Br Kr
+Rb Sr Y Zr Nb Mo Tc Ru Rh Pd Ag Cd In Sn Sb Te I Xe Cs Ba La Ce Pr Nd Pm Sm Eu Gd Tb Dy Ho Er Tm Yb
+Lu Hf Ta W Re Os Ir Pt Au Hg Tl Pb Bi Po At Rn Fr Ra Ac Th Pa U Np Pu Am Cm Bk Cf Es Fm Md No Lr Rf
+Db Sg Bh Hs Mt Ds Rg Cn Nh Fl Mc Lv Ts Og
+""".split()
+"""Element symbols in order of atomic number"""
+
+ATOMIC_NUMBERS = {sym: z for z, sym in enumerate(_ELEMENT_SYMBOLS, start=1)}
+"""Dictionary converting element symbols to atomic numbers"""
+
+
 @cache
 def atomic_number(element: str) -> int:
     """Returns the atomic number for the element"""
-    el = md_element(element)
-    return el.atomic_number
+    try:
+        return ATOMIC_NUMBERS[element]
+    except KeyError:
+        el = md_element(element)
+        return el.atomic_number
 
 
 AM_DICT = {
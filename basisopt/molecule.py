@@ -1,13 +1,135 @@
 # molecule
-from typing import Any
+import math
+import os
+import re
+from functools import lru_cache
+from typing import Any, Callable
 
 import numpy as np
 from monty.json import MSONable
+from scipy.spatial.distance import pdist, squareform
 
 from .containers import basis_to_dict, dict_to_basis
 from .data import GROUNDSTATE_MULTIPLICITIES, atomic_number
 from .exceptions import InvalidDiatomic
-from .util import bo_logger, dict_decode
+from .util import bo_logger, dict_decode, encode_array
+
+try:
+    from numba import njit, prange
+
+    _NUMBA = True
+except ImportError:
+    _NUMBA = False
+
+_MULT_CACHE = {name: m.value for name, m in GROUNDSTATE_MULTIPLICITIES.__members__.items()}
+"""Ground state multiplicities keyed by element symbol, built once from the Enum"""
+
+_DIATOMIC_RE = re.compile(r"^([A-Z][a-z]?)([A-Z][a-z]?|2)$")
+"""Matches diatomic formulae such as NO, LiH, HLi, LiCl, N2 or Ne2"""
+
+
+@lru_cache(maxsize=None)
+def _line_format(atom_prefix: str = "", atom_suffix: str = "") -> Callable[..., str]:
+    """Returns a bound str.format taking (element, x, y, z) for an xyz line,
+    with the prefix and suffix baked in so each variant is only built once
+    """
+    prefix = atom_prefix.replace("{", "{{").replace("}", "}}")
+    suffix = atom_suffix.replace("{", "{{").replace("}", "}}")
+    return (prefix + "{}" + suffix + "\t{:.10f}\t{:.10f}\t{:.10f}").format
+
+
+_LINE_FMT = _line_format()
+"""Formats an xyz line with no prefix or suffix"""
+
+if _NUMBA:
+
+    @njit(parallel=True, fastmath=True, cache=True)
+    def _pdist3(xyz: np.ndarray, out: np.ndarray):
+        """Fills out with the pairwise distances between the rows of the
+        (N, 3) array xyz; the diagonal of out is left untouched
+        """
+        n = xyz.shape[0]
+        for i in prange(n):
+            for j in range(i + 1, n):
+                dx = xyz[i, 0] - xyz[j, 0]
+                dy = xyz[i, 1] - xyz[j, 1]
+                dz = xyz[i, 2] - xyz[j, 2]
+                r = (dx * dx + dy * dy + dz * dz) ** 0.5
+                out[i, j] = r
+                out[j, i] = r
+
+
+_XYZ_BULK_ATOMS = 100
+"""Number of atoms from which xyz coordinates are parsed with np.loadtxt
+rather than line by line"""
+
+
+def _parse_xyz(filename: str) -> tuple[list[str], np.ndarray]:
+    """Parses the atoms out of an xyz file
+
+    Arguments:
+         filename (str): path to xyz file
+
+    Returns:
+         list of element symbols and (N, 3) array of coords
+    """
+    with open(filename, "r") as f:
+        # first line should be natoms
+        nat = int(f.readline())
+        # second line is title
+        f.readline()
+        lines = [line for _, line in zip(range(nat), f)]
+    if len(lines) >= _XYZ_BULK_ATOMS:
+        # C-level parse of all coordinate columns at once
+        coords = np.loadtxt(lines, usecols=(1, 2, 3), ndmin=2)
+        names = [line.split(None, 1)[0] for line in lines]
+    else:
+        # for a handful of atoms, loadtxt's setup costs more than it saves
+        names = []
+        coords = np.empty((len(lines), 3))
+        for i, line in enumerate(lines):
+            words = line.split()
+            names.append(words[0])
+            coords[i] = np.array(words[1:4], dtype=np.float64)
+    return names, coords
+
+
+@lru_cache(maxsize=32)
+def _load_xyz(
+    filename: str, mtime_ns: int, size: int, cache: bool
+) -> tuple[tuple[str, ...], np.ndarray]:
+    """Loads the atoms from an xyz file, keeping the result in memory.
+    The file's modification time (in ns) and size are part of the key so that
+    edited files are reread.
+
+    Arguments:
+         filename (str): absolute path to xyz file
+         mtime_ns (int): st_mtime_ns of the file
+         size (int): st_size of the file
+         cache (bool): if True, read from/write to a binary cache at filename.npz,
+            which records the mtime_ns and size of the file it was made from
+
+    Returns:
+         tuple of element symbols and read-only (N, 3) array of coords
+    """
+    cache_path = filename + ".npz"
+    source = np.array([mtime_ns, size], dtype=np.int64)
+    names = None
+    if cache and os.path.isfile(cache_path):
+        with np.load(cache_path) as data:
+            if "source" in data.files and np.array_equal(data["source"], source):
+                names, coords = data["names"].tolist(), data["coords"]
+    if names is None:
+        names, coords = _parse_xyz(filename)
+        if cache:
+            try:
+                np.savez(
+                    cache_path, names=np.array(names, dtype=str), coords=coords, source=source
+                )
+            except OSError as e:
+                bo_logger.warning("Could not write xyz cache %s: %s", cache_path, e.strerror)
+    coords.setflags(write=False)
+    return tuple(names), coords
 
 
 class Molecule(MSONable):
@@ -24,17 +146,40 @@ class Molecule(MSONable):
          jbasis (dict): internal basis dictionary for Coulomb fitting set
          jkbasis (dict): internal basis dictionary for Coulomb+Exchange fitting set
          of the form (element_symbol : array of Shell objects)
-         dummy_atoms (list): list of indices of atoms that should be treated as dummies
+         dummy_atoms (set): set of indices of atoms that should be treated as dummies
 
     Private attributes:
          _atom_names (list): atom symbols in order, e.g. ['H', 'H', 'O']
-         _coords (list): x,y,z coords in Angstrom, as numpy arrays, same
+         _coords (numpy array): (N, 3) view of x,y,z coords in Angstrom, same
          order as _atom_names
+         _coords_arr (numpy array): C-contiguous float64 buffer backing _coords,
+         may hold spare rows beyond the number of atoms
          _results (dict): dictionary of results calculated for this molecule.
          NOTE: these results are NOT archived, unlike for a Result object
          _references (dict): dictionary of reference values for results
+         _leg_cache (dict): legendre coefficients per element, with the shells
+         they were extracted from
     """
 
+    # MSONable does not define __slots__, so instances keep a __dict__, but the
+    # slots still give faster lookup of the attributes used on every call
+    __slots__ = (
+        "name",
+        "charge",
+        "multiplicity",
+        "method",
+        "basis",
+        "ecps",
+        "jbasis",
+        "jkbasis",
+        "_atom_names",
+        "dummy_atoms",
+        "_coords_arr",
+        "_results",
+        "_references",
+        "_leg_cache",
+    )
+
     def __init__(self, name: str = "Untitled", charge: int = 0, mult: int = None):
         self.name = name
         self.charge = charge
@@ -45,18 +190,60 @@ class Molecule(MSONable):
         self.jbasis = None
         self.jkbasis = None
         self._atom_names = []
-        self.dummy_atoms = []
-        self._coords = []
+        self.dummy_atoms = set()
+        self._coords_arr = np.empty((0, 3))
         self._results = {}
         self._references = {}
+        self._leg_cache = {}
+
+    def __setstate__(self, state: dict[str, Any]):
+        """Restores a pickled Molecule. Older pickles store a plain dict,
+        which would otherwise land in __dict__ behind the slots, may keep
+        the coords as a list under _coords, and may lack newer attributes
+        """
+        # start from the defaults for anything the pickle does not have
+        Molecule.__init__(self)
+        if isinstance(state, tuple):
+            # (__dict__, slots) pair written by default pickling
+            dict_state, slot_state = state
+            state = {**(dict_state or {}), **(slot_state or {})}
+        else:
+            state = dict(state)
+        coords = state.pop("_coords", None)
+        for k, v in state.items():
+            setattr(self, k, v)
+        if coords is not None:
+            self._coords = coords
+        if not isinstance(self.dummy_atoms, set):
+            self.dummy_atoms = set(self.dummy_atoms)
 
     def nelectrons(self) -> int:
         """Returns the number of electrons in the molecule, not accounting for any ECPs"""
-        unique = self.unique_atoms()
-        nel = 0
-        for a in unique:
-            nel += self._atom_names.count(a) * atomic_number(a)
-        return nel
+        return sum(map(atomic_number, self._atom_names))
+
+    @property
+    def _coords(self) -> np.ndarray:
+        return self._coords_arr[: len(self._atom_names)]
+
+    @_coords.setter
+    def _coords(self, coords: list):
+        self._coords_arr = np.array(coords, dtype=np.float64).reshape(-1, 3)
+
+    def coords_view(self) -> np.ndarray:
+        """Returns the coordinates without copying them, e.g. for a backend
+        that needs the whole geometry as one array.
+
+        The view is only valid until atoms are added: add_atom() and reserve()
+        may move the coords to a new buffer, after which the view keeps showing
+        the old geometry. Take a fresh view after changing the atoms rather
+        than caching it.
+
+        Returns:
+             read-only, C-contiguous (N, 3) float64 view of the coords in Angstrom
+        """
+        view = self._coords_arr[: len(self._atom_names)]
+        view.flags.writeable = False
+        return view
 
     def add_atom(
         self,
@@ -71,14 +258,29 @@ class Molecule(MSONable):
              coord (list): [x,y,z] coords in Angstrom
              dummy (bool): if True, the atom is marked as a dummy atom
         """
-        if self.multiplicity:
-            self.multiplicity = self.multiplicity
-        else:
-            self.multiplicity = getattr(GROUNDSTATE_MULTIPLICITIES, element).value
-        self._coords.append(np.array(coord))
+        if self.multiplicity is None:
+            self.multiplicity = _MULT_CACHE[element]
+        n = len(self._atom_names)
+        if n == len(self._coords_arr):
+            # grow the buffer geometrically rather than once per atom
+            self.reserve(max(4, 2 * n))
+        self._coords_arr[n] = coord
         self._atom_names.append(element)
         if dummy:
-            self.dummy_atoms.append(len(self._atom_names) - 1)
+            self.dummy_atoms.add(len(self._atom_names) - 1)
+
+    def reserve(self, nat: int):
+        """Makes room in the coordinate buffer for at least nat atoms in total,
+        so that adding atoms up to that number does not reallocate it
+
+        Arguments:
+             nat (int): number of atoms to make room for
+        """
+        if nat > len(self._coords_arr):
+            n = len(self._atom_names)
+            buf = np.empty((nat, 3))
+            buf[:n] = self._coords_arr[:n]
+            self._coords_arr = buf
 
     def add_result(self, name: str, value: Any):
         """Store a result (no archiving)
@@ -94,10 +296,7 @@ class Molecule(MSONable):
         Value of result with given name if it exists,
         otherwise 0
         """
-        try:
-            return self._results[name]
-        except KeyError:
-            return 0.0
+        return self._results.get(name, 0.0)
 
     def add_reference(self, name: str, value: Any):
         """Same as add_result but for reference values"""
@@ -105,40 +304,43 @@ class Molecule(MSONable):
 
     def get_reference(self, name: str) -> Any:
         """Same as get_result but for reference values"""
-        try:
-            return self._references[name]
-        except KeyError:
-            return 0.0
+        return self._references.get(name, 0.0)
 
     def get_delta(self, name: str) -> Any:
         """Returns:
         Difference between a result and its reference value
         """
-        return self.get_result(name) - self.get_reference(name)
+        return self._results.get(name, 0.0) - self._references.get(name, 0.0)
 
     @classmethod
     def from_xyz(
-        cls, filename: str, name: str = "Untitled", charge: int = 0, mult: int = 1
+        cls,
+        filename: str,
+        name: str = "Untitled",
+        charge: int = 0,
+        mult: int = 1,
+        cache: bool = False,
     ) -> object:
-        """Creates a Molecule from an xyz file
+        """Creates a Molecule from an xyz file. Parsed files are kept in memory,
+        so repeated reads of an unchanged file skip the parsing.
 
         Arguments:
              filename (str): path to xyz file
+             cache (bool): if True, also keep a binary copy of the parsed file
+                at filename.npz, which is used instead of the text while the
+                xyz file's modification time and size match those stored in it
         """
         instance = cls(name=name, charge=charge, mult=mult)
         try:
-            # Read in xyz file
-            with open(filename, "r") as f:
-                lines = f.readlines()
-            # parse
-            # first line should be natoms
-            nat = int(lines[0])
-            # second line is title
-            for line in lines[2 : 2 + nat]:
-                words = line.split()
-                element = words[0]
-                coords = np.array([float(w) for w in words[1:4]])
-                instance.add_atom(element=element, coord=coords)
+            path = os.path.abspath(filename)
+            stat = os.stat(path)
+            names, coords = _load_xyz(path, stat.st_mtime_ns, stat.st_size, cache)
+            if instance.multiplicity is None and names:
+                instance.multiplicity = _MULT_CACHE[names[0]]
+            # copy straight into a buffer of the right size
+            instance.reserve(len(names))
+            instance._coords_arr[: len(names)] = coords
+            instance._atom_names = list(names)
         except IOError as e:
             bo_logger.error("I/O error(%d): %s", e.errno, e.strerror)
         except Exception:
@@ -146,16 +348,26 @@ class Molecule(MSONable):
         return instance
 
     def to_xyz(self) -> str:
-        """Converts Molecule to xyz file format
+        """Converts Molecule to xyz file format, with coords to 10 decimal places
 
         Returns:
              a string of the Molecule in xyz file format
         """
         output = f"{self.natoms()}\n{self.name}, generated by BasisOpt\n"
-        for i in range(self.natoms()):
-            output += self.get_line(i) + "\n"
+        if self._atom_names:
+            output += self._format_lines() + "\n"
         return output
 
+    def _format_lines(self, atom_prefix: str = "", atom_suffix: str = "") -> str:
+        """Formats every atom as a line of the xyz file representation,
+        as in get_line, joined by newlines
+        """
+        fmt = _line_format(atom_prefix, atom_suffix)
+        # tolist converts all coords to Python floats in one pass
+        return "\n".join(
+            fmt(n, x, y, z) for n, (x, y, z) in zip(self._atom_names, self._coords.tolist())
+        )
+
     def get_line(self, i: int, atom_prefix: str = "", atom_suffix: str = "") -> str:
         """Gets a line of the xyz file representation of the Molecule
 
@@ -167,12 +379,12 @@ class Molecule(MSONable):
                 (for e.g. dummy atoms in Orca)
 
         Returns:
-             a string of form {prefix+element+suffix} {coords}
+             a string of form {prefix+element+suffix} {coords}, with the coords
+             to 10 decimal places
         """
-        ix = max(i, 0)
-        ix = min(ix, len(self._atom_names) - 1)
-        n, c = self._atom_names[ix], self._coords[ix]
-        return f"{atom_prefix}{n}{atom_suffix}\t{c[0]}\t{c[1]}\t{c[2]}"
+        ix = min(max(i, 0), len(self._atom_names) - 1)
+        fmt = _line_format(atom_prefix, atom_suffix) if atom_prefix or atom_suffix else _LINE_FMT
+        return fmt(self._atom_names[ix], *self._coords_arr[ix].tolist())
 
     def natoms(self) -> int:
         """Returns number of atoms in Molecule"""
@@ -190,7 +402,8 @@ class Molecule(MSONable):
                 be either a name from BSE (for Psi4 backend), or the Orca internal
                 library (for Orca backend, list of names can be found in the manual)
         """
-        self.ecps = {k: v for k, v in ecp_dict.items() if k.title() in self._atom_names}
+        names = set(self._atom_names)
+        self.ecps = {k: v for k, v in ecp_dict.items() if k.title() in names}
 
     def set_dummy_atoms(self, indices: list[int], overwrite: bool = True):
         """Sets the list of atoms that should be considered dummies or ghosts
@@ -200,14 +413,19 @@ class Molecule(MSONable):
              overwrite: if True, will overwrite any existing list of dummies,
                  otherwise will append to the existing list
         """
-        valid_atoms = [ix for ix in indices if ix in range(self.natoms())]
+        nat = self.natoms()
+        valid_atoms = {ix for ix in indices if 0 <= ix < nat}
         if overwrite:
             self.dummy_atoms = valid_atoms
         else:
-            self.dummy_atoms.extend(valid_atoms)
-        self.dummy_atoms = list(set(self.dummy_atoms))
+            self.dummy_atoms |= valid_atoms
+
+    @property
+    def dummy_atoms_list(self) -> list[int]:
+        """Returns the indices of the dummy atoms in ascending order"""
+        return sorted(self.dummy_atoms)
 
-    def get_legendre_params(self, element: str = None):
+    def get_legendre_params(self, element: str = None, as_array: bool = False):
         """Returns the legendre coefficients from the basis set where available.
         By default returns all elements in the basis set unless specified.
 
@@ -216,26 +434,47 @@ class Molecule(MSONable):
         ----------
         element : str, optional
             Specific element from basis set. The default is None.
+        as_array : bool, optional
+            When returning all elements, give the coefficients as numpy arrays
+            rather than lists. The default is False.
 
         Returns
         -------
         dict
             Dictionary of elements containing a dictionary for each angular
-            momentum's legendre coefficients.
+            momentum's legendre coefficients. The per-element dictionaries are
+            cached, so should not be modified.
 
         """
         if element:
             return {shell.l: shell.leg_params for shell in self.basis[element]}
         else:
             return {
-                element: {
-                    shell.l: shell.leg_params[0].tolist()
-                    for shell in self.basis[element]
-                    if shell.leg_params
-                }
+                element: self._element_legendre_params(element, as_array)
                 for element in self.basis.keys()
             }
 
+    def _element_legendre_params(self, element: str, as_array: bool) -> dict[str, Any]:
+        """Returns the legendre coefficients for a single element, reusing the
+        previous result while the element's shells and their parameters are
+        the same objects. Strategies replace shells and leg_params rather than
+        modifying them in place, so identity is enough to detect a change.
+        """
+        shells = self.basis[element]
+        key = tuple(obj for shell in shells for obj in (shell, shell.leg_params))
+        cached = self._leg_cache.get((element, as_array))
+        if cached is not None:
+            old_key, params = cached
+            if len(old_key) == len(key) and all(a is b for a, b in zip(old_key, key)):
+                return params
+        params = {
+            shell.l: shell.leg_params[0] if as_array else shell.leg_params[0].tolist()
+            for shell in shells
+            if shell.leg_params
+        }
+        self._leg_cache[(element, as_array)] = (key, params)
+        return params
+
     def distance(self, atom1: int, atom2: int) -> float:
         """Computes the Euclidean distance between two atoms.
         No bounds checking.
@@ -246,9 +485,29 @@ class Molecule(MSONable):
         Returns:
              the Euclidean separation in Angstrom
         """
-        c1 = self._coords[atom1]
-        c2 = self._coords[atom2]
-        return np.linalg.norm(c1 - c2)
+        # scalar arithmetic beats numpy dispatch for single 3-vectors
+        coords = self._coords
+        x1, y1, z1 = coords[atom1].tolist()
+        x2, y2, z2 = coords[atom2].tolist()
+        dx, dy, dz = x1 - x2, y1 - y2, z1 - z2
+        return math.sqrt(dx * dx + dy * dy + dz * dz)
+
+    def distance_matrix(self) -> np.ndarray:
+        """Computes the Euclidean distances between all pairs of atoms,
+        using a compiled kernel if numba is installed.
+
+        Returns:
+             (N, N) numpy array of separations in Angstrom
+        """
+        coords = self._coords
+        if _NUMBA:
+            out = np.zeros((len(coords), len(coords)))
+            _pdist3(coords, out)
+            return out
+        if len(coords) < 2:
+            # squareform cannot infer the size of an empty condensed matrix
+            return np.zeros((len(coords), len(coords)))
+        return squareform(pdist(coords))
 
     def as_dict(self) -> dict[str, Any]:
         """Converts Molecule to MSONable dictionary
@@ -266,8 +525,8 @@ class Molecule(MSONable):
             "basis": basis_to_dict(self.basis),
             "ecps": self.ecps,
             "atom_names": self._atom_names,
-            "dummy_atoms": self.dummy_atoms,
-            "coords": self._coords,
+            "dummy_atoms": self.dummy_atoms_list,
+            "coords": encode_array(self.coords_view()),
             "results": self._results,
             "references": self._references,
         }
@@ -298,8 +557,8 @@ class Molecule(MSONable):
         instance.jbasis = d.get("jbasis", None)
         instance.jkbasis = d.get("jkbasis", None)
         instance._atom_names = d.get("atom_names", [])
-        instance.dummy_atoms = d.get("dummy_atoms", [])
-        instance.coords = d.get("coords", [])
+        instance.dummy_atoms = set(d.get("dummy_atoms", []))
+        instance._coords = d.get("coords", [])
         instance._results = d.get("results", {})
         instance._references = d.get("references", {})
         return instance
@@ -322,42 +581,33 @@ def build_diatomic(mol_str: str, charge: int = 0, mult: int = 1) -> Molecule:
          InvalidDiatomic when mol_str can't be parsed
          error checking not exhaustive
     """
+    atom1, atom2, rval = _parse_diatomic(mol_str)
     molecule = Molecule(name=mol_str + "_Diatomic", charge=charge, mult=mult)
-    # parse the mol string, form "Atom1Atom2,Separation(ang)"
-    parts = mol_str.split(",")
-    chars = list(parts[0])
-    rval = float(parts[1])
-    nchars = len(chars)
-    atom1 = None
-    atom2 = None
-    if chars[0].isupper():
-        if nchars == 2:
-            # either something like NO or N2
-            if chars[1] == "2":
-                atom1 = atom2 = chars[0]
-            elif chars[1].isupper():
-                atom1 = chars[0]
-                atom2 = chars[1]
-        elif nchars == 3:
-            if chars[2] == "2":
-                # eg Ne2
-                atom1 = atom2 = "".join(chars[:2])
-            elif chars[1].isupper():
-                # eg HLi
-                atom1 = chars[0]
-                atom2 = "".join(chars[1:])
-            elif chars[1].islower():
-                # eg LiH
-                atom1 = "".join(chars[:2])
-                atom2 = chars[2]
-        elif nchars == 4 and chars[2].isupper():
-            # eg LiCl
-            atom1 = "".join(chars[:2])
-            atom2 = "".join(chars[2:4])
-
-    if (atom1 is None) or (atom2 is None):
-        raise InvalidDiatomic
-
     molecule.add_atom(element=atom1, coord=[0.0, 0.0, -0.5 * rval])
     molecule.add_atom(element=atom2, coord=[0.0, 0.0, 0.5 * rval])
     return molecule
+
+
+@lru_cache(maxsize=256)
+def _parse_diatomic(mol_str: str) -> tuple[str, str, float]:
+    """Parses a diatomic string of the form "Atom1Atom2,Separation(ang)"
+
+    Arguments:
+         mol_str (str): string of diatomic and separation, e.g. "NO,1.3"
+
+    Returns:
+         the two element symbols and the separation in Angstrom
+
+    Raises:
+         IndexError when rval not given in mol_str
+         InvalidDiatomic when mol_str can't be parsed
+    """
+    parts = mol_str.split(",")
+    rval = float(parts[1])
+    match = _DIATOMIC_RE.match(parts[0])
+    if match is None:
+        raise InvalidDiatomic
+    atom1, atom2 = match.groups()
+    if atom2 == "2":
+        atom2 = atom1
+    return atom1, atom2, rval
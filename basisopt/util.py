@@ -1,4 +1,5 @@
 # utility functions
+import base64
 import json
 import logging
 from typing import Any
@@ -40,9 +41,48 @@ def write_json(filename: str, obj: MSONable):
         bo_logger.error("%s cannot be converted to JSON format", obj_type)
 
 
+def encode_array(arr: np.ndarray) -> dict[str, Any]:
+    """Encodes a numpy array as its raw bytes, so that it can be
+    serialised without converting every element to text
+
+    Arguments:
+         arr (numpy array): array to encode
+
+    Returns:
+         json-writable dictionary, which dict_decode converts back to an array
+    """
+    arr = np.ascontiguousarray(arr)
+    return {
+        "__ndarray__": base64.b64encode(arr.tobytes()).decode("ascii"),
+        "dtype": arr.dtype.str,
+        "shape": list(arr.shape),
+    }
+
+
+def decode_array(d: dict[str, Any]) -> np.ndarray:
+    """Inverse of encode_array
+
+    Arguments:
+         d (dict): dictionary created by encode_array
+
+    Returns:
+         a writable copy of the encoded array
+    """
+    buffer = base64.b64decode(d["__ndarray__"])
+    return np.frombuffer(buffer, dtype=d["dtype"]).reshape(d["shape"]).copy()
+
+
+def _decode_arrays(v: Any) -> Any:
+    if isinstance(v, dict) and "__ndarray__" in v:
+        return decode_array(v)
+    if isinstance(v, list):
+        return [_decode_arrays(x) for x in v]
+    return v
+
+
 def dict_decode(d: dict[str, Any]) -> dict[str, Any]:
     decoder = MontyDecoder()
-    return {k: decoder.process_decoded(v) for k, v in d.items()}
+    return {k: _decode_arrays(decoder.process_decoded(v)) for k, v in d.items()}
 
 
 def fit_poly(
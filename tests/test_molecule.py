@@ -1,5 +1,13 @@
+import os
+import pickle
+import shutil
+
+import numpy as np
 import pytest
 
+from basisopt import molecule
+from basisopt.basis.atomic import AtomicBasis
+from basisopt.basis.basis import legendre_expansion
 from basisopt.exceptions import InvalidDiatomic
 from basisopt.molecule import Molecule, build_diatomic
 from tests.data.utils import almost_equal
@@ -22,6 +30,12 @@ def test_nelectrons():
     m = Molecule.from_xyz("tests/data/caffeine.xyz")
     assert m.nelectrons() == 102
 
+    # names outside the symbol table fall back to mendeleev
+    m = Molecule(mult=1)
+    m.add_atom(element="Ne")
+    m._atom_names = ["Neon"]
+    assert m.nelectrons() == 10
+
 
 def test_add_atom():
     m = Molecule()
@@ -36,6 +50,36 @@ def test_add_atom():
     assert almost_equal(m.distance(0, 1), 1.5)
 
 
+def test_reserve():
+    m = Molecule()
+    m.reserve(10)
+    assert m.natoms() == 0
+    assert m._coords.shape == (0, 3)
+    buffer = m._coords_arr
+    for i in range(10):
+        m.add_atom(element="He", coord=[float(i), 0.0, 0.0])
+    assert m._coords_arr is buffer
+    assert almost_equal(m.distance(0, 9), 9.0)
+
+    # reserving less than the current size keeps all atoms
+    m.reserve(2)
+    assert m.natoms() == 10
+    m.add_atom(element="He", coord=[10.0, 0.0, 0.0])
+    assert almost_equal(m.distance(0, 10), 10.0)
+
+
+def test_add_atom_multiplicity():
+    m = Molecule()
+    m.add_atom(element="N")
+    assert m.multiplicity == 4
+    m.add_atom(element="O")
+    assert m.multiplicity == 4
+
+    m = Molecule(mult=1)
+    m.add_atom(element="O")
+    assert m.multiplicity == 1
+
+
 def test_add_get_result():
     m = Molecule()
     m.add_result("energy", -0.5)
@@ -75,15 +119,167 @@ def test_from_xyz():
     assert almost_equal(m.distance(1, 3), 2.4636465289488934)
     assert almost_equal(m.distance(6, 22), 4.250292507670527)
     assert almost_equal(m.distance(2, 2), 0.0)
+    assert almost_equal(m.distance(-1, 0), m.distance(23, 0))
 
     # test get_line
-    line1 = "H\t-3.380413\t-1.1272367\t0.5733036"
-    line2 = "N\t0.9668296\t-1.0737425\t-0.8198227"
-    line24 = "H\t-1.2074498\t2.7537592\t1.7203047"
+    line1 = "H\t-3.3804130000\t-1.1272367000\t0.5733036000"
+    line2 = "N\t0.9668296000\t-1.0737425000\t-0.8198227000"
+    line24 = "H\t-1.2074498000\t2.7537592000\t1.7203047000"
     assert m.get_line(1) == line2
     assert m.get_line(23) == line24
     assert m.get_line(44) == line24
     assert m.get_line(-3) == line1
+    assert m.get_line(0, atom_prefix="@") == "@" + line1
+    assert m.get_line(1, atom_suffix=":") == "N:" + line2[1:]
+
+
+def test_parse_xyz(monkeypatch):
+    names, coords = molecule._parse_xyz("tests/data/caffeine.xyz")
+    monkeypatch.setattr(molecule, "_XYZ_BULK_ATOMS", 1)
+    bulk_names, bulk_coords = molecule._parse_xyz("tests/data/caffeine.xyz")
+    assert len(names) == 24
+    assert coords.shape == (24, 3)
+    assert bulk_names == names
+    assert np.array_equal(bulk_coords, coords)
+
+
+def test_from_xyz_cache(tmp_path):
+    xyz = tmp_path / "caffeine.xyz"
+    shutil.copy("tests/data/caffeine.xyz", xyz)
+    m = Molecule.from_xyz(str(xyz), cache=True)
+    assert (tmp_path / "caffeine.xyz.npz").is_file()
+
+    # replace the text with garbage of the same size and modification time,
+    # so a successful load can only have come from the .npz file
+    stat = os.stat(xyz)
+    xyz.write_bytes(b"x" * stat.st_size)
+    os.utime(xyz, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    molecule._load_xyz.cache_clear()
+
+    cached = Molecule.from_xyz(str(xyz), cache=True)
+    assert cached.natoms() == 24
+    assert cached._atom_names == m._atom_names
+    assert np.allclose(cached._coords, m._coords)
+
+    # molecules must not share coordinates through the cache
+    cached.add_atom(element="H", coord=[1.0, 1.0, 1.0])
+    cached._coords[0] = [0.0, 0.0, 0.0]
+    assert Molecule.from_xyz(str(xyz), cache=True).get_line(0) == m.get_line(0)
+
+
+@pytest.mark.parametrize("cache", [False, True])
+def test_from_xyz_rewrite(tmp_path, cache):
+    xyz = tmp_path / "atom.xyz"
+    xyz.write_text("1\natom\nHe 1 2 3\n")
+    stat = os.stat(xyz)
+    assert Molecule.from_xyz(str(xyz), cache=cache)._atom_names == ["He"]
+
+    # new contents, but the same modification time
+    xyz.write_text("1\natom\nNe 1.5 2 3\n")
+    os.utime(xyz, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    m = Molecule.from_xyz(str(xyz), cache=cache)
+    assert m._atom_names == ["Ne"]
+    assert np.array_equal(m._coords, [[1.5, 2.0, 3.0]])
+
+    # the binary cache must also be rejected once the in-memory copy is gone
+    molecule._load_xyz.cache_clear()
+    xyz.write_text("1\natom\nAr 1.25 2 3\n")
+    os.utime(xyz, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    assert Molecule.from_xyz(str(xyz), cache=cache)._atom_names == ["Ar"]
+
+
+def test_to_xyz():
+    m = Molecule(name="Empty")
+    assert m.to_xyz() == "0\nEmpty, generated by BasisOpt\n"
+
+    m = Molecule.from_xyz("tests/data/caffeine.xyz", name="Caffeine")
+    lines = m.to_xyz().split("\n")
+    assert lines[0] == "24"
+    assert lines[1] == "Caffeine, generated by BasisOpt"
+    assert len(lines) == 27
+    assert lines[2] == m.get_line(0)
+    assert lines[25] == m.get_line(23)
+    assert lines[26] == ""
+
+
+def test_get_legendre_params():
+    m = Molecule()
+    m.basis["ne"] = legendre_expansion(
+        [((3.0, 4.5, 0.75, 0.25, 0.1, 0.1), 13), ((2.2, 4.5, 0.44, 0.29, 0.07, 0.02), 12)]
+    )
+    params = m.get_legendre_params()
+    assert params["ne"]["s"] == [3.0, 4.5, 0.75, 0.25, 0.1, 0.1]
+    assert len(params["ne"]["p"]) == 6
+    assert m.get_legendre_params()["ne"] is params["ne"]
+
+    arrays = m.get_legendre_params(as_array=True)
+    assert isinstance(arrays["ne"]["p"], np.ndarray)
+
+    # replacing a shell must invalidate the cached coefficients
+    m.basis["ne"][1] = legendre_expansion([((1.0, 2.0), 8)], l=1)[0]
+    assert m.get_legendre_params()["ne"]["p"] == [1.0, 2.0]
+
+
+def test_distance_matrix():
+    m = Molecule.from_xyz("tests/data/caffeine.xyz")
+    dists = m.distance_matrix()
+    assert dists.shape == (24, 24)
+    assert almost_equal(dists[0, 5], m.distance(0, 5))
+    assert almost_equal(dists[22, 6], m.distance(6, 22))
+    assert almost_equal(dists[2, 2], 0.0)
+
+    assert Molecule().distance_matrix().shape == (0, 0)
+
+
+def test_distance_matrix_fallback(monkeypatch):
+    m = Molecule.from_xyz("tests/data/caffeine.xyz")
+    dists = m.distance_matrix()
+    monkeypatch.setattr(molecule, "_NUMBA", False)
+    assert np.allclose(m.distance_matrix(), dists)
+    assert Molecule().distance_matrix().shape == (0, 0)
+
+
+def test_coords_view():
+    m = Molecule.from_xyz("tests/data/caffeine.xyz")
+    view = m.coords_view()
+    assert view.shape == (24, 3)
+    assert view.dtype == np.float64
+    assert view.flags["C_CONTIGUOUS"]
+    assert np.shares_memory(view, m._coords_arr)
+    with pytest.raises(ValueError):
+        view[0, 0] = 1.0
+
+    # the molecule itself can still be moved
+    m._coords[0] = [1.0, 2.0, 3.0]
+    assert np.array_equal(view[0], [1.0, 2.0, 3.0])
+
+
+def test_pickle():
+    m = Molecule.from_xyz("tests/data/caffeine.xyz", name="Caffeine")
+    m.set_dummy_atoms([1, 3])
+    new_m = pickle.loads(pickle.dumps(m))
+    assert new_m.to_xyz() == m.to_xyz()
+    assert new_m.dummy_atoms == {1, 3}
+
+    # pickled before coords were stored as an array and __slots__ were added
+    legacy = AtomicBasis().load("tests/data/oxygen-unopt.obj")._molecule
+    assert legacy.name == "O_atom"
+    assert legacy.natoms() == 1
+    assert legacy.nelectrons() == 8
+    assert legacy.to_xyz().split("\n")[2] == "O\t0.0000000000\t0.0000000000\t0.0000000000"
+    assert legacy.dummy_atoms == set()
+    assert legacy._leg_cache == {}
+
+
+def test_as_dict():
+    m = Molecule.from_xyz("tests/data/caffeine.xyz", name="Caffeine")
+    m.set_dummy_atoms([1, 3])
+    new_m = Molecule.from_dict(m.as_dict())
+    assert new_m.name == "Caffeine"
+    assert new_m.natoms() == 24
+    assert new_m._atom_names == m._atom_names
+    assert new_m.dummy_atoms == {1, 3}
+    assert np.allclose(new_m._coords, m._coords)
 
 
 def test_set_dummy_atoms():
@@ -98,6 +294,14 @@ def test_set_dummy_atoms():
     assert len(m.dummy_atoms) == 7
     m.set_dummy_atoms([22, 23, 24, 25], overwrite=True)
     assert len(m.dummy_atoms) == 2
+    assert m.dummy_atoms_list == [22, 23]
+
+    m.set_dummy_atoms([-1, 5, 3, 5])
+    assert m.dummy_atoms_list == [3, 5]
+
+    m = Molecule()
+    m.add_atom(element="He", dummy=True)
+    assert 0 in m.dummy_atoms
 
 
 def test_set_ecps():
@@ -132,6 +336,9 @@ def test_build_diatomic():
     assert licl.natoms() == 2
     assert len(licl.unique_atoms()) == 2
 
+    hli = build_diatomic("HLi,1.6")
+    assert hli._atom_names == ["H", "Li"]
+
     with pytest.raises(IndexError):
         _ = build_diatomic("H2")
 
@@ -140,3 +347,7 @@ def test_build_diatomic():
         _ = build_diatomic("Ne,1.4")
         _ = build_diatomic("C5,1.4")
         _ = build_diatomic("CHCl3,1.4")
+
+    for mol_str in ["Ne,1.4", "C5,1.4", "CHCl3,1.4", "no,1.3"]:
+        with pytest.raises(InvalidDiatomic):
+            _ = build_diatomic(mol_str)
@@ -1,7 +1,17 @@
+import numpy as np
 import pandas as pd
 
 from basisopt.data import get_even_temper_params
-from basisopt.util import fit_poly, read_json
+from basisopt.molecule import Molecule
+from basisopt.util import (
+    decode_array,
+    dict_decode,
+    encode_array,
+    fit_poly,
+    read_json,
+    write_json,
+)
+from tests.data import shells as shell_data
 
 
 def test_read_json():
@@ -13,6 +23,38 @@ def test_read_json():
     assert type(shell.exps).__name__ == "ndarray"
 
 
+def test_encode_array():
+    arr = np.arange(12, dtype=np.float64).reshape(4, 3) / 7.0
+    d = encode_array(arr)
+    assert d["shape"] == [4, 3]
+    new_arr = decode_array(d)
+    assert np.array_equal(new_arr, arr)
+    assert new_arr.flags["WRITEABLE"]
+
+    decoded = dict_decode({"a": d, "b": [encode_array(arr[0])], "c": 1})
+    assert np.array_equal(decoded["a"], arr)
+    assert np.array_equal(decoded["b"][0], arr[0])
+    assert decoded["c"] == 1
+
+
+def test_write_json(tmp_path):
+    m = Molecule.from_xyz("tests/data/caffeine.xyz", name="Caffeine")
+    m.basis = shell_data.get_vdz_internal()
+    m.add_result("energy", -0.5)
+    m.add_result("failed", float("nan"))
+    filename = str(tmp_path / "caffeine.json")
+    write_json(filename, m)
+
+    new_m = read_json(filename)
+    assert new_m.name == "Caffeine"
+    assert np.array_equal(new_m._coords, m._coords)
+    assert new_m.get_result("energy") == -0.5
+    assert np.isnan(new_m.get_result("failed"))
+    for s, s_ in zip(m.basis["h"], new_m.basis["h"]):
+        assert np.array_equal(s.exps, s_.exps)
+        assert np.array_equal(s.coefs[0], s_.coefs[0])
+
+
 def test_fit_poly():
     data = pd.read_csv("tests/data/cl2.csv")
     _, xref, re, pt = fit_poly(data["R"], data["ECC"], n=6)